@@ -2,13 +2,17 @@ import pygame
 import json
 import os
 import math
+from functools import partial
+
+import numpy as np
 
 # CONFIG MANAGER (создаёт config.json автоматически)
 
 DEFAULT_CONFIG = {
     "window": {
         "width": 2000,
-        "height": 950
+        "height": 950,
+        "render_scale": 0.5                  # сцена рисуется в уменьшенном буфере
     },
 
     "colors": {
@@ -57,64 +61,117 @@ def load_or_create_config(path="config.json"):
 
 # FOURIER SERIES
 class FourierSeries:
-    def __init__(self, series_type="square"):
+    def __init__(self, series_type="square", max_terms=60):
         self.series_type = series_type
+        self.max_terms = max_terms
+        self._build_tables()
 
     def toggle(self):
         if self.series_type == "square":
             self.series_type = "sawtooth"
         else:
             self.series_type = "square"
+        self._build_tables()
 
     def name(self):
         return "Square wave" if self.series_type == "square" else "Sawtooth wave"
 
-    def get_term(self, term_index):
-        """Возвращает (radius, freq, direction) для term_index."""
+    def _build_tables(self):
+        """Заранее считает массивы radii, freqs, dirs для всех max_terms гармоник.
+
+        float32: для пикселей экрана точности хватает с запасом.
+        """
         if self.series_type == "square":
             # прямоугольник: нечётные гармоники 1,3,5,...
-            n = 2 * term_index + 1
-            radius = 4.0 / (math.pi * n)
-            freq = n
-            direction = 1
+            n = 2 * np.arange(self.max_terms) + 1
+            self.radii = (4.0 / (np.pi * n)).astype(np.float32)
+            self.freqs = n.astype(np.float32)
+            self.dirs = np.ones(self.max_terms, dtype=np.float32)
         else:  # sawtooth
-            n = term_index + 1
-            radius = 2.0 / (math.pi * n)
-            freq = n
-            direction = 1 if n % 2 else -1
-
-        return radius, freq, direction
+            n = np.arange(1, self.max_terms + 1)
+            self.radii = (2.0 / (np.pi * n)).astype(np.float32)
+            self.freqs = n.astype(np.float32)
+            self.dirs = np.where(n % 2, 1.0, -1.0).astype(np.float32)
 
 
 # WAVE TRACER
+
+# верхняя граница буфера волны: при wave_speed <= 0 точки не уходят за край
+WAVE_MAX_POINTS = 20000
+
 class WaveTracer:
-    """Хранит и рисует точки волны справа."""
+    """Хранит и рисует точки волны справа (кольцевой буфер без перевыделений)."""
 
     def __init__(self, origin_x, max_width, color, speed):
         self.origin_x = origin_x
         self.max_width = max_width
         self.color = color
         self.speed = speed
-        self.points = []
+
+        # при speed > 0 точка живёт не дольше max_width / speed кадров;
+        # при speed <= 0 она до края не дойдёт — тогда самые старые точки
+        # просто перезаписываются по кругу в буфере WAVE_MAX_POINTS
+        if speed > 0:
+            self._capacity = min(int(max_width / speed) + 2, WAVE_MAX_POINTS)
+        else:
+            self._capacity = WAVE_MAX_POINTS
+        self._buf = np.empty((self._capacity, 2), dtype=np.float32)
+        self._head = 0      # куда пишется следующая точка
+        self._count = 0     # сколько точек сейчас видно
 
     def reset(self):
-        self.points.clear()
+        self._head = 0
+        self._count = 0
 
     def add(self, y):
-        self.points.insert(0, [self.origin_x, y])
+        self._buf[self._head] = (self.origin_x, y)
+        self._head = (self._head + 1) % self._capacity
+        self._count = min(self._count + 1, self._capacity)
 
     def update(self):
-        for p in self.points:
-            p[0] += self.speed
-        self.points = [p for p in self.points if p[0] < self.max_width]
+        # сдвигаем весь буфер: лишние ячейки не мешают, зато без ветвлений
+        self._buf[:, 0] += self.speed
 
-    def draw(self, surface):
-        if len(self.points) > 1:
-            pygame.draw.lines(surface, self.color, False, self.points, 2)
+        # самые старые точки — самые правые, отрезаем их с хвоста
+        tail = (self._head - self._count) % self._capacity
+        while self._count and self._buf[tail, 0] >= self.max_width:
+            tail = (tail + 1) % self._capacity
+            self._count -= 1
+
+    def _points(self):
+        """Видимые точки от новой к старой."""
+        idx = (self._head - 1 - np.arange(self._count)) % self._capacity
+        return self._buf[idx]
+
+    def draw(self, surface, scale=1.0):
+        if self._count > 1:
+            # int32: int16 молча переполняется при большом scale;
+            # список из целых pygame разбирает быстрее, чем строки ndarray
+            pts = (self._points() * scale).astype(np.int32).tolist()
+            width = max(1, round(2 * scale))
+            pygame.draw.lines(surface, self.color, False, pts, width)
 
 
 # SIMULATION CORE
 
+# раз в столько кадров фазоры пересчитываются точно, чтобы не копилась ошибка
+PHASOR_RESYNC_FRAMES = 1000
+
+# неизменная часть подсказки — рендерится шрифтом один раз
+HELP_LINES = [
+    "Controls:",
+    "  + / Up    = add term",
+    "  - / Down  = remove term",
+    "  F         = switch function",
+    "  Space     = pause",
+    "  R         = reset",
+    "  [ / ]     = rot speed - / +",
+    "  ESC       = quit"
+]
+
+# сколько отрендеренных строк состояния держать в кэше
+TEXT_CACHE_SIZE = 200
+
 class Simulation:
     def __init__(self, config):
 
@@ -126,11 +183,14 @@ class Simulation:
         self.time = 0.0
         self.paused = False
 
+        # кадр нужно перерисовать (состояние менялось с прошлого draw)
+        self.dirty = True
+
         self.time_speed = anim["time_speed"]
         self.time_step = anim["time_step"]
 
-        self.num_terms = fw["initial_terms"]
         self.max_terms = fw["max_terms"]
+        self.num_terms = max(1, min(fw["initial_terms"], self.max_terms))
         self.scale = fw["scale"]
 
         # скорость вращения эпицирклов
@@ -142,8 +202,29 @@ class Simulation:
         self.colors = config["colors"]
 
         win_w = config["window"]["width"]
+        win_h = config["window"]["height"]
+
+        # эпицирклы и волна рисуются в буфер меньшего размера и растягиваются
+        # на экран: растеризации в render_scale**2 раз меньше
+        self.render_scale = config["window"].get("render_scale", 1.0)
+        if self.render_scale != 1.0:
+            self._scene = pygame.Surface(
+                (int(win_w * self.render_scale), int(win_h * self.render_scale))
+            )
+        else:
+            self._scene = None
+
+        # неподвижный фон сцены (заливка и вертикальная граница волны) —
+        # рисуется один раз, дальше только копируется
+        s = self.render_scale
+        self._bg = pygame.Surface((int(win_w * s), int(win_h * s)))
+        self._bg.fill(self.colors["background"])
+        origin_x = int(self.wave_origin_x * s)
+        pygame.draw.line(self._bg, self.colors["line"],
+                         (origin_x, 0),
+                         (origin_x, self._bg.get_height()), 1)
 
-        self.fourier = FourierSeries(fw["function"])
+        self.fourier = FourierSeries(fw["function"], self.max_terms)
 
         self.wave = WaveTracer(
             origin_x=self.wave_origin_x,
@@ -152,29 +233,55 @@ class Simulation:
             speed=fw["wave_speed"]
         )
 
-        self.epicycles = []
+        # общий буфер строк [x0, y0, x1, y1, r]; epicycles — срез первых num_terms
+        self._epi = np.empty((self.max_terms, 5), dtype=np.float32)
+        self.epicycles = self._epi[:0]
         self.end_point = (0, 0)
 
+        # вращающиеся фазоры exp(i * angle) всех гармоник и их поворот за кадр
+        self._frame = 0
+        self._phasors = np.empty(self.max_terms, dtype=np.complex64)
+        self._rebuild_phasors()
+
+        # срезы под текущее num_terms; пересоздаются только при его смене
+        self._update_views()
+
         pygame.font.init()
         self.font = pygame.font.SysFont("consolas", 20)
 
+        self._help_surfs = [self._render(line) for line in HELP_LINES]
+        self._text_cache = {}
+
     # управление
 
     def change_terms(self, d):
         self.num_terms += d
         self.num_terms = max(1, min(self.num_terms, self.max_terms))
+        self._update_views()
+        self.dirty = True
+
+    def change_rotation_speed(self, d):
+        self.rotation_speed = max(0.05, self.rotation_speed + d)
+        self._rebuild_phasors()
+        self.dirty = True
 
     def toggle_pause(self):
         self.paused = not self.paused
+        self.dirty = True
 
     def toggle_function(self):
         self.fourier.toggle()
         self.wave.reset()
         self.time = 0
+        self._rebuild_phasors()
+        self._update_views()
+        self.dirty = True
 
     def reset(self):
         self.wave.reset()
         self.time = 0
+        self._sync_phasors()
+        self.dirty = True
 
     # шаг симуляции
 
@@ -184,73 +291,147 @@ class Simulation:
 
         # чем меньше time_step и time_speed, тем медленнее вращение
         self.time += self.time_step * self.time_speed
+        self._advance_phasors()
 
         self._update_epicycles()
         self.wave.update()
+        self.dirty = True
+
+    def _angular_speeds(self):
+        # НОВОЕ: добавили rotation_speed
+        # углы растут со временем, поэтому сами фазы считаем в float64
+        harmonics = (self.fourier.dirs * self.fourier.freqs).astype(np.float64)
+        return harmonics * 2 * math.pi * self.rotation_speed
+
+    def _rebuild_phasors(self):
+        """Пересчитывает поворот за кадр после смены функции или скорости."""
+        dt = self.time_step * self.time_speed
+        self._omegas = np.exp(1j * self._angular_speeds() * dt).astype(np.complex64)
+        self._sync_phasors()
+
+    def _sync_phasors(self):
+        """Точное значение фазоров для текущего времени (сброс накопленной ошибки)."""
+        self._phasors[:] = np.exp(1j * self._angular_speeds() * self.time)
+
+    def _update_views(self):
+        k = self.num_terms
+        self._radii_v = self.fourier.radii[:k]
+        self._phasors_v = self._phasors[:k]
+        self._epi_v = self._epi[:k]
+
+    def _advance_phasors(self):
+        # вместо cos/sin на каждую гармонику — одно комплексное умножение
+        self._frame += 1
+        if self._frame % PHASOR_RESYNC_FRAMES == 0:
+            self._sync_phasors()
+        else:
+            self._phasors *= self._omegas
 
     def _update_epicycles(self):
+        cx, cy = self.center_x, self.center_y
+        phasors = self._phasors_v
 
-        self.epicycles = []
-
-        x, y = float(self.center_x), float(self.center_y)
+        epi = self._epi_v
+        xs, ys, amps = epi[:, 2], epi[:, 3], epi[:, 4]
 
-        for i in range(self.num_terms):
-            radius, freq, direction = self.fourier.get_term(i)
+        # масштабированные радиусы считаем один раз на кадр
+        np.multiply(self.scale, self._radii_v, out=amps)
 
-            # НОВОЕ: добавили rotation_speed
-            angle = direction * freq * self.time * 2 * math.pi * self.rotation_speed
+        # все гармоники сразу: смещения и накопленные концы радиусов
+        np.multiply(amps, phasors.real, out=xs)
+        np.cumsum(xs, out=xs)
+        xs += cx
+        np.multiply(amps, phasors.imag, out=ys)
+        np.cumsum(ys, out=ys)
+        ys += cy
 
-            x0, y0 = x, y
-            x += self.scale * radius * math.cos(angle)
-            y += self.scale * radius * math.sin(angle)
-            r = abs(self.scale * radius)
+        # центр каждой окружности — конец предыдущего радиуса
+        epi[0, 0], epi[0, 1] = cx, cy
+        epi[1:, 0:2] = epi[:-1, 2:4]
+        np.abs(amps, out=amps)
 
-            self.epicycles.append((x0, y0, x, y, r))
-
-        self.end_point = (x, y)
-        self.wave.add(y)
+        self.epicycles = epi
+        self.end_point = (float(xs[-1]), float(ys[-1]))
+        self.wave.add(self.end_point[1])
 
     # отрисовка
 
     def draw(self, surface):
-        self._draw_epicycles(surface)
-        self._draw_line(surface)
-        self.wave.draw(surface)
+        scene = surface if self._scene is None else self._scene
+
+        scene.blit(self._bg, (0, 0))
+        self._draw_epicycles(scene)
+        self._draw_line(scene)
+        self.wave.draw(scene, self.render_scale)
+
+        if scene is not surface:
+            pygame.transform.scale(scene, surface.get_size(), surface)
+
+        # текст — поверх, в полном разрешении, чтобы оставался чётким
         self._draw_text(surface)
+        self.dirty = False
 
     def _draw_epicycles(self, surface):
-        for (sx, sy, ex, ey, r) in self.epicycles:
-            pygame.draw.circle(surface, self.colors["epicycle"], (int(sx), int(sy)), int(r), 1)
-            pygame.draw.line(surface, self.colors["epicycle"],
-                             (int(sx), int(sy)), (int(ex), int(ey)), 2)
+        if len(self.epicycles) == 0:
+            return
+
+        color = self.colors["epicycle"]
+        # все координаты переводим в целые пиксели одним действием на кадр
+        epi = np.rint(self.epicycles * self.render_scale).astype(np.int32)
+
+        # окружности целиком за краем экрана не рисуем
+        w, h = surface.get_size()
+        cx, cy, r = epi[:, 0], epi[:, 1], epi[:, 4]
+        visible = (cx - r < w) & (cx + r > 0) & (cy - r < h) & (cy + r > 0)
+
+        for sx, sy, r in epi[visible][:, [0, 1, 4]].tolist():
+            pygame.draw.circle(surface, color, (sx, sy), r, 1)
+
+        # все радиусы — одна ломаная: центр, затем концы каждой гармоники
+        pts = np.vstack((epi[:, 0:2], epi[-1, 2:4]))
+        width = max(1, round(2 * self.render_scale))
+        pygame.draw.lines(surface, color, False, pts.tolist(), width)
 
     def _draw_line(self, surface):
+        s = self.render_scale
         ex, ey = self.end_point
-        pygame.draw.line(surface, self.colors["line"], (int(ex), int(ey)),
-                         (self.wave_origin_x, int(ey)), 1)
-
-        pygame.draw.line(surface, self.colors["line"],
-                         (self.wave_origin_x, 0),
-                         (self.wave_origin_x, self.config["window"]["height"]), 1)
+        origin_x = int(self.wave_origin_x * s)
+
+        # связка до волны вырождается в точку, если конец уже у начала волны
+        if abs(origin_x - ex * s) >= 1:
+            pygame.draw.line(surface, self.colors["line"], (int(ex * s), int(ey * s)),
+                             (origin_x, int(ey * s)), 1)
+
+        # граница волны уже есть в фоне, но раньше она рисовалась поверх
+        # эпицирклов: повторяем её, только если какая-то окружность
+        # (а с ней и радиус внутри) до неё дотягивается
+        epi = self.epicycles
+        if len(epi) and np.any(np.abs(epi[:, 0] - self.wave_origin_x) * s <= epi[:, 4] * s + 1):
+            pygame.draw.line(surface, self.colors["line"],
+                             (origin_x, 0),
+                             (origin_x, surface.get_height()), 1)
+
+    def _render(self, line):
+        return self.font.render(line, True, self.colors["text"])
+
+    def _cached_text(self, line):
+        """Строки состояния меняются редко — рендерим каждую один раз."""
+        img = self._text_cache.get(line)
+        if img is None:
+            if len(self._text_cache) >= TEXT_CACHE_SIZE:
+                self._text_cache.clear()
+            img = self._text_cache[line] = self._render(line)
+        return img
 
     def _draw_text(self, surface):
-        lines = [
+        status = [
             f"Function: {self.fourier.name()}",
             f"Terms: {self.num_terms}",
             f"Rot speed: {self.rotation_speed:.2f}",
-            "Controls:",
-            "  + / Up    = add term",
-            "  - / Down  = remove term",
-            "  F         = switch function",
-            "  Space     = pause",
-            "  R         = reset",
-            "  [ / ]     = rot speed - / +",
-            "  ESC       = quit"
         ]
 
         x, y = 20, 20
-        for line in lines:
-            img = self.font.render(line, True, self.colors["text"])
+        for img in [self._cached_text(line) for line in status] + self._help_surfs:
             surface.blit(img, (x, y))
             y += 22
 
@@ -260,59 +441,79 @@ def main():
 
     config = load_or_create_config()
 
+    # JSON отдаёт списки; pygame быстрее разбирает цвета-кортежи
+    config["colors"] = {k: tuple(v) for k, v in config["colors"].items()}
+    config["layout"]["epicycle_center"] = tuple(config["layout"]["epicycle_center"])
+
     pygame.init()
     screen = pygame.display.set_mode(
         (config["window"]["width"], config["window"]["height"])
     )
     pygame.display.set_caption("Fourier Visualization")
 
+    # остальные события (движение мыши и т.п.) отсекаются ещё в SDL
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed([
+        pygame.QUIT, pygame.KEYDOWN, pygame.MOUSEWHEEL, pygame.WINDOWEXPOSED
+    ])
+
     clock = pygame.time.Clock()
     sim = Simulation(config)
-    bg = config["colors"]["background"]
     fps = config["animation"]["fps"]
 
     running = True
 
-    while running:
+    def stop():
+        nonlocal running
+        running = False
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
+    more_terms = partial(sim.change_terms, +1)
+    fewer_terms = partial(sim.change_terms, -1)
 
-            if event.type == pygame.KEYDOWN:
+    # одна клавиша — один обработчик; синонимы указывают на одну функцию
+    keymap = {
+        pygame.K_ESCAPE: stop,
 
-                if event.key == pygame.K_ESCAPE:
-                    running = False
+        pygame.K_PLUS: more_terms,
+        pygame.K_EQUALS: more_terms,
+        pygame.K_UP: more_terms,
 
-                if event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_UP):
-                    sim.change_terms(+1)
+        pygame.K_MINUS: fewer_terms,
+        pygame.K_UNDERSCORE: fewer_terms,
+        pygame.K_DOWN: fewer_terms,
 
-                if event.key in (pygame.K_MINUS, pygame.K_UNDERSCORE, pygame.K_DOWN):
-                    sim.change_terms(-1)
+        pygame.K_SPACE: sim.toggle_pause,
+        pygame.K_f: sim.toggle_function,
+        pygame.K_r: sim.reset,
 
-                if event.key == pygame.K_SPACE:
-                    sim.toggle_pause()
+        # НОВОЕ: регулировка скорости вращения эпицирклов
+        pygame.K_LEFTBRACKET: partial(sim.change_rotation_speed, -0.05),   # [
+        pygame.K_RIGHTBRACKET: partial(sim.change_rotation_speed, +0.05),  # ]
+    }
 
-                if event.key == pygame.K_f:
-                    sim.toggle_function()
+    while running:
 
-                if event.key == pygame.K_r:
-                    sim.reset()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                stop()
 
-                # НОВОЕ: регулировка скорости вращения эпицирклов
-                if event.key == pygame.K_LEFTBRACKET:   # [
-                    sim.rotation_speed = max(0.05, sim.rotation_speed - 0.05)
-                if event.key == pygame.K_RIGHTBRACKET:  # ]
-                    sim.rotation_speed += 0.05
+            if event.type == pygame.KEYDOWN:
+                handler = keymap.get(event.key)
+                if handler:
+                    handler()
 
             if event.type == pygame.MOUSEWHEEL:
                 sim.change_terms(event.y)
 
+            if event.type == pygame.WINDOWEXPOSED:
+                sim.dirty = True
+
         sim.update()
 
-        screen.fill(bg)
-        sim.draw(screen)
-        pygame.display.flip()
+        # на паузе кадр не меняется — не перерисовываем и не делаем flip
+        if sim.dirty:
+            sim.draw(screen)
+            pygame.display.flip()
         clock.tick(fps)
 
     pygame.quit()